@@ -1,5 +1,7 @@
+import os
+
 try:
-    from subprocess import run
+    from subprocess import run, Popen, PIPE, DEVNULL
 except ImportError:
     print('You must run this program with python3 not python2:\n'
           '    brew install python3')
@@ -7,10 +9,10 @@ except ImportError:
 
 try:
     import pyaudio
-    import audioop
+    import numpy as np
 except ImportError:
-    print('Missing pyaudio, run:\n'
-          '    pip3 install --upgrade pyaudio audioop')
+    print('Missing pyaudio or numpy, run:\n'
+          '    pip3 install --upgrade pyaudio numpy')
     raise
 
 
@@ -19,6 +21,14 @@ FORMAT = pyaudio.paInt16
 CHANNELS = 1
 RATE = 44100
 POLL_SPEED = 0.001
+KBRIGHTNESS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'kbrightness')
+MAX_LEVEL = 0xfff   # kbrightness resolution, see keyboard-brightness.c
+LEVEL_SCALE = MAX_LEVEL / 20000     # rms -> level index, rms of 20000 is full brightness
+
+# pre-encoded kbrightness input lines, so the runloop never formats or encodes a level.
+# each line is the middle of its level's bucket, so kbrightness truncating level * 0xfff
+# (in float32) always lands on exactly that hardware level
+LEVEL_LINES = [('%.9g\n' % ((i + 0.5) / MAX_LEVEL)).encode() for i in range(MAX_LEVEL + 1)]
 
 
 def get_mic(p):
@@ -30,22 +40,62 @@ def get_mic(p):
     return stream
 
 
-def runloop(stream):
+def get_kbrightness():
+    # older kbrightness builds don't know --stdin, they print the brightness (or an error) and exit,
+    # while a build with --stdin support reads EOF here and exits without printing anything
+    if run([KBRIGHTNESS, '--stdin'], stdin=DEVNULL, capture_output=True).stdout:
+        print('[!] kbrightness has no --stdin support, falling back to one kbrightness run per update.\n'
+              '    Recompile it to fix this:\n'
+              '    gcc -std=c99 -o kbrightness keyboard-brightness.c -framework IOKit -framework ApplicationServices')
+        return None
+
+    # one long-running kbrightness reading levels from stdin, instead of a fork+exec per chunk
+    return Popen([KBRIGHTNESS, '--stdin'], stdin=PIPE, bufsize=0)
+
+
+def runloop(stream, kb):
+    last_level = None
+    squares = np.empty(CHUNK, dtype=np.int64)   # reused every chunk, wide enough to square int16 samples
     while True:
-        data = stream.read(CHUNK)
-        rms = audioop.rms(data, 2)         # here's where you calculate the volume
-        level = rms / 20000
-        run(['./kbrightness', str(level)])
+        data = stream.read(CHUNK, exception_on_overflow=False)   # don't raise on input overflow, other errors still do
+        samples = np.frombuffer(data, dtype=np.int16)   # a view over data, no copy
+        # here's where you calculate the volume, widening into the preallocated int64 buffer
+        # keeps the sum of squares from overflowing without allocating per chunk
+        np.copyto(squares, samples)
+        rms = np.sqrt(np.dot(squares, squares) / CHUNK)
+        level = int(rms * LEVEL_SCALE)
+        if level > MAX_LEVEL:
+            level = MAX_LEVEL
+        # level is exactly the hardware level kbrightness will set (see LEVEL_LINES),
+        # so skip the write + IOKit call when the device value wouldn't change
+        if level != last_level:
+            if kb is None:
+                run([KBRIGHTNESS, LEVEL_LINES[level].strip()])
+            else:
+                try:
+                    kb.stdin.write(LEVEL_LINES[level])
+                except BrokenPipeError:
+                    pass                            # reported just below
+                if kb.poll() is not None:
+                    print('[X] kbrightness exited with status %s' % kb.returncode)
+                    return
+            last_level = level
 
 
 if __name__ == '__main__':
     print('[+] Starting...')
     p = pyaudio.PyAudio()
     stream = get_mic(p)
+    kb = get_kbrightness()
     try:
-        runloop(stream)
+        runloop(stream, kb)
     except (KeyboardInterrupt, Exception):
+        pass
+    finally:
         stream.stop_stream()
         stream.close()
         p.terminate()
+        if kb is not None:
+            kb.stdin.close()
+            kb.wait()
         print('[X] Stopped.')
@@ -4,6 +4,7 @@
     Usage:
         gcc -std=c99 -o kbrightness keyboard-brightness.c -framework IOKit -framework ApplicationServices
         ./kbrightness 0.8
+        ./kbrightness --stdin      # set brightness once per level read from stdin
 */
 
 enum {
@@ -13,6 +14,7 @@ enum {
   kSetLEDFadeID = 3,        // setLEDFade(int, int, int, int *)
 };
 
+#include <string.h>
 #include <mach/mach.h>
 #include <IOKit/IOKitLib.h>
 #include <CoreFoundation/CoreFoundation.h>
@@ -80,6 +82,11 @@ float getKeyboardBrightness(void) {
 void setKeyboardBrightness(float in) {
     kern_return_t kr;
 
+    // clamp here so callers (blink, audio.py, scripts) can pass raw levels,
+    // written as !(in >= 0) so NaN (which scanf accepts as "nan") also becomes 0
+    if (!(in >= 0)) in = 0;
+    if (in > 1) in = 1;
+
     uint64_t inputCount  = 2;
     uint64_t inputValues[2];
     uint64_t in_unknown = 0;
@@ -116,6 +123,13 @@ int main(int argc, char **argv) {
     float brightness;
     if (argc > 1 && sscanf(argv[1], "%f", &brightness) == 1) {
         setKeyboardBrightness(brightness);
+    } else if (argc > 1 && strcmp(argv[1], "--stdin") == 0) {
+        // echo 0.523 | ./kbrightness --stdin
+        // keeps one process (and one IOService connection) open for programs that
+        // update the brightness at high frequencies, instead of spawning us per update
+        while (scanf("%f", &brightness) == 1) {
+            setKeyboardBrightness(brightness);
+        }
     } else {
         printf("%f", getKeyboardBrightness());
     }